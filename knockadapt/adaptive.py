@@ -1,6 +1,7 @@
 import copy
 import numpy as np
 import scipy.cluster.hierarchy as hierarchy
+from multiprocessing import Pool
 
 from . import utilities
 from . import knockoff_stats
@@ -290,6 +291,14 @@ def weighted_binomial_feature_stat(
     return sigmaN2 * np.random.randn(R) + estimates
 
 
+def _eval_knockoff_instance_seeded(gkval, seed, args):
+    """ Seeds the global random state and then calls
+    gkval.eval_knockoff_instance(*args). This is a module-level
+    function so it can be pickled for multiprocessing. """
+    np.random.seed(seed)
+    return gkval.eval_knockoff_instance(*args)
+
+
 class GroupKnockoffEval:
     """ Evaluates power, fdr, empirical power
     of different groupings of knockoffs. 
@@ -318,6 +327,8 @@ class GroupKnockoffEval:
         # Save values
         self.p = corr_matrix.shape[0]
         self.sigma = corr_matrix
+        # Precision matrix, computed on first use by sample_knockoffs
+        self.invSigma = None
         self.q = q
         self.non_nulls = non_nulls
         self.feature_stat = feature_stat()
@@ -349,6 +360,14 @@ class GroupKnockoffEval:
 
         knockoff_kwargs = self.combine_S_kwargs(kwargs)
 
+        # Cache the precision matrix for MX knockoffs, which the
+        # sampler would otherwise recompute for every sample
+        if "invSigma" not in knockoff_kwargs and not knockoff_kwargs.get("fixedX"):
+            if self.invSigma is None:
+                self.invSigma = utilities.chol2inv(self.sigma)
+            knockoff_kwargs["invSigma"] = self.invSigma
+            knockoff_kwargs["check_invSigma"] = False
+
         # Possibly recycle to some extent:
         if recycle_up_to is not None:
 
@@ -365,9 +384,13 @@ class GroupKnockoffEval:
                 **knockoff_kwargs
             )
 
-            # Recycle first half and combine
-            recycled_knockoffs = np.repeat(trainX, copies).reshape(-1, self.p, copies)
-            all_knockoffs = np.concatenate((recycled_knockoffs, test_knockoffs), axis=0)
+            # Recycle first half and combine (broadcasting trainX
+            # across the copies). Store copies in the outer axis so
+            # each copy is a contiguous n x p block.
+            all_knockoffs = np.empty((copies, X.shape[0], self.p))
+            all_knockoffs = all_knockoffs.transpose(1, 2, 0)
+            all_knockoffs[:recycle_up_to] = trainX[:, :, np.newaxis]
+            all_knockoffs[recycle_up_to:] = test_knockoffs
 
         # Else, vanilla Knockoff generation
         else:
@@ -410,21 +433,18 @@ class GroupKnockoffEval:
         selected_flags = (W >= T).astype("float32")
 
         # Empirical power
-        hat_power = (
-            np.einsum("m,m->", (1 / group_sizes), selected_flags) / num_non_nulls
-        )
+        weighted_flags = selected_flags / group_sizes
+        hat_power = weighted_flags.sum() / num_non_nulls
 
         # Possibly, calculate oracle FDP and power
         if self.non_nulls is not None:
 
             # True power
-            power = np.einsum(
-                "m,m,m->", (1 / group_sizes), selected_flags, group_selections
-            )
+            power = np.dot(weighted_flags, group_selections)
             power = power / num_non_nulls
 
             # FDP
-            FDP = np.einsum("p,p->", selected_flags, 1 - group_selections)
+            FDP = np.dot(selected_flags, 1 - group_selections)
             FDP = FDP / max(1, selected_flags.sum())
 
         else:
@@ -433,7 +453,17 @@ class GroupKnockoffEval:
 
         return FDP, power, hat_power, W
 
-    def eval_grouping(self, X, y, groups, recycle_up_to=None, copies=20, **kwargs):
+    def eval_grouping(
+        self,
+        X,
+        y,
+        groups,
+        recycle_up_to=None,
+        copies=20,
+        numprocesses=1,
+        knockoffs=None,
+        **kwargs
+    ):
         """ 
         Calculates empirical power, power, and FDP by
         running knockoffs. Does this "copies" times.
@@ -445,46 +475,60 @@ class GroupKnockoffEval:
         for the first k observations. This is necessary to prevent 
         "double dipping," i.e. looking at the data before runnign
         knockoffs, from violating FDR control. Defaults to None. 
+        :param int numprocesses: Number of processes used to evaluate
+        the knockoff copies in parallel. Defaults to 1 (no multiprocessing).
+        The results do not depend on numprocesses, but when it is above 1
+        the copies are fit in worker processes, so self.feature_stat
+        does not keep the attributes (e.g. model) of the last fit.
+        :param knockoffs: n x p x copies array of pre-sampled knockoffs,
+        which must be valid group knockoffs for groups. If supplied,
+        no new knockoffs are sampled. Defaults to None.
         :param kwargs: kwargs to pass to knockoff sampler
         """
 
         # Group sizes
         group_sizes = utilities.calc_group_sizes(groups)
 
+        # Without any knockoff copies, there is nothing to sample or fit
+        if knockoffs is not None:
+            copies = knockoffs.shape[2]
+        if copies == 0:
+            hat_powers = np.zeros(0)
+            Ws = np.zeros((0, group_sizes.shape[0]))
+            if self.non_nulls is None:
+                return hat_powers, Ws
+            else:
+                return np.zeros(0), np.zeros(0), hat_powers, Ws
+
         # Get knockoffs
-        all_knockoffs = self.sample_knockoffs(
-            X=X, groups=groups, recycle_up_to=recycle_up_to, copies=copies, **kwargs
-        )
+        if knockoffs is None:
+            all_knockoffs = self.sample_knockoffs(
+                X=X, groups=groups, recycle_up_to=recycle_up_to, copies=copies, **kwargs
+            )
+        else:
+            all_knockoffs = knockoffs
 
         # Possibly calculate true selections for this grouping
+        group_selections = None
         if self.non_nulls is not None:
             group_selections = utilities.fetch_group_nonnulls(self.non_nulls, groups)
 
         # For each knockoff, calculate FDP, empirical power, power.
-        fdps = []
-        powers = []
-        hat_powers = []
-        Ws = []
-
-        # Loop through each knockoff - TODO: paralellize properly
+        # The copies are independent, so possibly use multiprocessing.
+        # Feature statistics may use the global random state, so each
+        # copy gets its own seed (otherwise forked workers would all
+        # start from the same state).
+        seeds = np.random.randint(0, 2 ** 31 - 1, size=copies)
+        all_arguments = []
         for j in range(copies):
-
-            # Calculate one FDP, power, hatpower for each copy
-            knockoffs = all_knockoffs[:, :, j]
-            fdp, power, hat_power, W = self.eval_knockoff_instance(
-                X=X,
-                y=y,
-                groups=groups,
-                knockoffs=knockoffs,
-                group_sizes=group_sizes,
-                group_selections=group_selections,
-            )
-
-            # Append
-            fdps.append(fdp)
-            powers.append(power)
-            hat_powers.append(hat_power)
-            Ws.append(W)
+            args = (X, all_knockoffs[:, :, j], y, groups, group_sizes, group_selections)
+            all_arguments.append((self, seeds[j], args))
+        if numprocesses == 1:
+            outputs = [_eval_knockoff_instance_seeded(*args) for args in all_arguments]
+        else:
+            with Pool(numprocesses) as thepool:
+                outputs = thepool.starmap(_eval_knockoff_instance_seeded, all_arguments)
+        fdps, powers, hat_powers, Ws = zip(*outputs)
 
         # Return
         hat_powers = np.array(hat_powers)
@@ -505,6 +549,7 @@ class GroupKnockoffEval:
         reduction=10,
         max_group_size=100,
         S_matrices=None,
+        share_knockoffs=False,
         **kwargs
     ):
         """
@@ -519,8 +564,14 @@ class GroupKnockoffEval:
         try 10 different grouping. These will be evenly spaced cutoffs 
         on the link.
         :param S_matrices: dictionary mapping cutoffs to S matrix for knockoffs
-        :param kwargs: kwargs to eval_grouping, may contain kwargs to 
-        gaussian group knockoffs constructor.
+        :param share_knockoffs: If True, sample knockoffs once for the
+        grouping at the smallest cutoff and reuse them for every cutoff.
+        The groupings are nested, so these are valid group knockoffs for
+        each coarser grouping, although not the most powerful ones.
+        Defaults to False.
+        :param kwargs: kwargs to eval_grouping (e.g. copies or 
+        numprocesses), may contain kwargs to gaussian group knockoffs
+        constructor.
 
         returns: the list of cutoffs, associated FDR estimates, 
         associated power estimates, and associated empirical powers. 
@@ -538,6 +589,19 @@ class GroupKnockoffEval:
         if S_matrices is None:
             S_matrices = {cutoff: None for cutoff in cutoffs}
 
+        # Possibly sample knockoffs once for the finest grouping
+        knockoffs = None
+        if share_knockoffs:
+            finest_cutoff = min(cutoffs)
+            finest_groups = hierarchy.fcluster(
+                link, finest_cutoff, criterion="distance"
+            )
+            sample_kwargs = copy.copy(kwargs)
+            sample_kwargs.pop("numprocesses", None)
+            knockoffs = self.sample_knockoffs(
+                X=X, groups=finest_groups, S=S_matrices[finest_cutoff], **sample_kwargs
+            )
+
         # Initialize
         cutoff_hat_powers = []
         cutoff_fdps = []
@@ -555,7 +619,9 @@ class GroupKnockoffEval:
             S = S_matrices[cutoff]
 
             # Possible just get empirical powers if there's no ground truth
-            outputs = self.eval_grouping(X, y, groups, S=S, **kwargs)
+            outputs = self.eval_grouping(
+                X, y, groups, S=S, knockoffs=knockoffs, **kwargs
+            )
 
             # Return differently based on whether non_nulls supplied
             if self.non_nulls is None:
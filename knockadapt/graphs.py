@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 from scipy import stats
 
@@ -7,7 +8,6 @@ from .utilities import shift_until_PSD, chol2inv, cov2corr
 
 # Tree methods
 import scipy.cluster.hierarchy as hierarchy
-import scipy.spatial.distance as ssd
 
 # Graphing
 import matplotlib.pyplot as plt
@@ -46,7 +46,7 @@ def DirichletCorr(p=100, temp=1, tol=1e-6):
      The p dirichlet parameters are i.i.d. uniform [tol, temp].
     """
     alpha = np.random.uniform(temp, size=p)
-    d = stats.dirichlet(alpha=alpha).rvs().reshape(-1)
+    d = np.random.dirichlet(alpha)
 
     # We have to round to prevent errors from random_correlation,
     # which is supperr sensitive to d.sum() != p even when the 
@@ -69,7 +69,7 @@ def AR1(p=30, a=1, b=1, tol=1e-3, rho=None):
 
     # Generate rhos, take log to make multiplication easier
     if rho is None:
-        rhos = np.log(stats.beta.rvs(size=p, a=a, b=b))
+        rhos = np.log(np.random.beta(a, b, size=p))
     else:
         if np.abs(rho) > 1:
             raise ValueError(f"rho {rho} must be a correlation between -1 and 1")
@@ -80,8 +80,11 @@ def AR1(p=30, a=1, b=1, tol=1e-3, rho=None):
     cumrhos = np.cumsum(rhos).reshape(p, 1)
 
     # Use cumsum tricks to calculate all correlations
-    log_corrs = -1 * np.abs(cumrhos - cumrhos.transpose())
-    corr_matrix = np.exp(log_corrs)
+    # (in place, to avoid p x p temporaries)
+    corr_matrix = cumrhos - cumrhos.transpose()
+    np.abs(corr_matrix, out=corr_matrix)
+    np.negative(corr_matrix, out=corr_matrix)
+    np.exp(corr_matrix, out=corr_matrix)
 
     # Ensure PSD-ness
     corr_matrix = cov2corr(shift_until_PSD(corr_matrix, tol))
@@ -94,12 +97,12 @@ def NestedAR1(p=500, a=7, b=1, tol=1e-3, num_nests=5, nest_size=2):
     with hierarchical correlation structure.
     """
     # First set of correlations
-    rhos = np.log(stats.beta.rvs(size=p, a=a, b=b))
+    rhos = np.log(np.random.beta(a, b, size=p))
     rhos[0] = 0
 
     # Create nested structure
     for j in range(1, num_nests+1):
-        rho_samples = np.log(stats.beta.rvs(size=p, a=a, b=b))
+        rho_samples = np.log(np.random.beta(a, b, size=p))
         # These indexes will get smaller correlations
         nest_inds = np.array([
             x for x in range(p) if x % (nest_size**j) == int(nest_size / 2)
@@ -113,8 +116,11 @@ def NestedAR1(p=500, a=7, b=1, tol=1e-3, num_nests=5, nest_size=2):
     cumrhos = np.cumsum(rhos).reshape(p, 1)
 
     # Use cumsum tricks to calculate all correlations
-    log_corrs = -1 * np.abs(cumrhos - cumrhos.transpose())
-    corr_matrix = np.exp(log_corrs)
+    # (in place, to avoid p x p temporaries)
+    corr_matrix = cumrhos - cumrhos.transpose()
+    np.abs(corr_matrix, out=corr_matrix)
+    np.negative(corr_matrix, out=corr_matrix)
+    np.exp(corr_matrix, out=corr_matrix)
 
     # Ensure PSD-ness
     corr_matrix = cov2corr(shift_until_PSD(corr_matrix, 1e-3))
@@ -127,21 +133,22 @@ def ErdosRenyi(p=300, delta=0.2, lower=0.1, upper=1, tol=1e-1):
     matrices. Follows https://arxiv.org/pdf/1908.11611.pdf.
     """
 
-    # Initialization
-    V = np.zeros((p, p))
-    triang_size = int((p ** 2 + p) / 2)
+    # Initialization (the diagonal is always 1)
+    V = np.eye(p)
+    triang_size = int((p ** 2 - p) / 2)
 
-    # Sample the upper triangle
-    mask = stats.bernoulli.rvs(delta, size=triang_size)
+    # Sample the strict upper triangle: each entry is nonzero
+    # w.p. delta, with a random sign, in a single draw
+    signs = np.random.choice(
+        [-1, 0, 1], size=triang_size, p=[delta / 2, 1 - delta, delta / 2]
+    )
     vals = np.random.uniform(lower, upper, size=triang_size)
-    flags = 2*np.random.binomial(1, 0.5, triang_size) - 1
-    triang = mask * flags * vals
+    triang = signs * vals
 
-    # Set values and add diagonal
-    upper_inds = np.triu_indices(p, 0)
+    # Set values in both triangles
+    upper_inds = np.triu_indices(p, 1)
     V[upper_inds] = triang
-    V = V + V.T
-    V += np.eye(p) - np.diag(np.diag(V))
+    V[upper_inds[::-1]] = triang
 
     # Force to be positive definite -
     V = shift_until_PSD(V, tol=tol)
@@ -157,10 +164,43 @@ def PartialCorr(
     """
     Q_init = rho*np.ones((p, p)) + (1-rho)*np.eye(p)
     V = utilities.chol2inv(Q_init)
-    V = utilities.cov2corr(V)
-    Q = utilities.chol2inv(V)
+    # Rescaling V to a correlation matrix rescales its
+    # inverse by the reciprocal scales (no second inversion)
+    scale = np.sqrt(np.diag(V))
+    scale_matrix = np.outer(scale, scale)
+    V = V / scale_matrix
+    Q = Q_init * scale_matrix
     return V, Q
 
+@functools.lru_cache(maxsize=2)
+def daibarber2016_matrices(p, group_size, rho, gamma):
+    """ Creates the (zero-indexed) groups, correlation matrix,
+    precision matrix, and cholesky factor of the correlation matrix
+    for daibarber2016_graph. These only depend on the arguments,
+    so they are cached: the returned arrays are read-only, and
+    daibarber2016_matrices.cache_clear() empties the cache.
+    Each entry holds three p x p matrices, so only the most
+    recent couple of settings are kept.
+    """
+
+    # Set default values
+    num_groups = int(p / group_size)
+
+    # Create groups
+    groups = (np.arange(0, p, 1) / (p / num_groups)).astype("int")
+
+    # Create correlation matrix (rho within groups, gamma * rho
+    # between groups), invert
+    same_group = groups.reshape(-1, 1) == groups.reshape(1, -1)
+    Sigma = np.where(same_group, rho, gamma * rho).astype("float64")
+    np.fill_diagonal(Sigma, 1)
+    L = np.linalg.cholesky(Sigma)
+    Q = chol2inv(Sigma, L=L)
+
+    for M in [groups, Sigma, Q, L]:
+        M.flags.writeable = False
+    return groups, Sigma, Q, L
+
 def daibarber2016_graph(
     n=3000,
     p=1000,
@@ -188,26 +228,8 @@ def daibarber2016_graph(
     :param **kwargs: Args passed to sample_response function.
     """
 
-    # Set default values
-    num_groups = int(p / group_size)
-
-    # Create groups
-    groups = np.array([int(i / (p / num_groups)) for i in range(p)])
-
-    # Helper fn for covariance matrix
-    def get_corr(g1, g2):
-        if g1 == g2:
-            return rho
-        else:
-            return gamma * rho
-
-    get_corr = np.vectorize(get_corr)
-
-    # Create correlation matrix, invert
-    Xcoords, Ycoords = np.meshgrid(groups, groups)
-    Sigma = get_corr(Xcoords, Ycoords)
-    Sigma = Sigma + np.eye(p) - np.diagflat(np.diag(Sigma))
-    Q = chol2inv(Sigma)
+    # Create groups and (cached) correlation/precision matrices
+    groups, Sigma, Q, L = daibarber2016_matrices(p, group_size, rho, gamma)
 
     # Create beta
     if beta is None:
@@ -225,11 +247,11 @@ def daibarber2016_graph(
     # Sample design matrix
     if mu is None:
         mu = np.zeros(p)
-    X = stats.multivariate_normal.rvs(mean=mu, cov=Sigma, size=n)
+    X = sample_mvn(mu=mu, Sigma=Sigma, n=n, Sigma_sqrt=L)
     # Sample y
     y = sample_response(X, beta, **kwargs)
 
-    return X, y, beta, Q, Sigma, groups + 1
+    return X, y, beta, Q.copy(), Sigma.copy(), groups + 1
 
 def create_sparse_coefficients(
     p,
@@ -276,7 +298,7 @@ def create_sparse_coefficients(
         chosen_groups = np.random.choice(
             np.unique(groups), num_nonzero_groups, replace=False
         )
-        beta = np.array([coeff_size if i in chosen_groups else 0 for i in groups])
+        beta = np.where(np.isin(groups, chosen_groups), coeff_size, 0)
 
     else:
 
@@ -291,7 +313,7 @@ def create_sparse_coefficients(
             np.random.shuffle(beta)
 
     # Now draw random signs
-    signs = 1 - 2 * stats.bernoulli.rvs(sign_prob, size=p)
+    signs = 1 - 2 * np.random.binomial(1, sign_prob, size=p)
 
     # Possibly change the absolute values of beta
     if coeff_dist is not None:
@@ -377,12 +399,38 @@ def sample_response(X, beta, cond_mean='linear', y_dist="gaussian"):
         y = cond_mean + np.random.standard_normal((n))
     elif y_dist == "binomial":
         probs = 1 / (1 + np.exp(-1 * cond_mean))
-        y = stats.bernoulli.rvs(probs)
+        y = np.random.binomial(1, probs)
     else:
         raise ValueError(f"y_dist must be one of 'gaussian', 'binomial', not {y_dist}")
 
     return y
 
+def sample_mvn(mu, Sigma, n=50, Sigma_sqrt=None):
+    """
+    Samples n draws from a multivariate Gaussian with mean mu
+    and covariance Sigma, as Z Sigma_sqrt^T + mu for standard
+    normal Z. This avoids the eigendecomposition scipy performs
+    on every call.
+    :param mu: p-dimensional mean
+    :param Sigma: p x p covariance matrix
+    :param n: The number of data points to sample
+    :param Sigma_sqrt: Possibly pass in a square root L of Sigma
+    (such that L L^T = Sigma) for more efficient sampling. By default
+    uses the cholesky square root, falling back to an eigendecomposition
+    with clipped eigenvalues when Sigma is singular.
+    returns: n x p numpy array
+    """
+    if Sigma_sqrt is None:
+        try:
+            Sigma_sqrt = np.linalg.cholesky(Sigma)
+        except np.linalg.LinAlgError:
+            eigvals, eigvecs = np.linalg.eigh(Sigma)
+            Sigma_sqrt = eigvecs * np.sqrt(np.maximum(eigvals, 0))
+
+    p = Sigma_sqrt.shape[0]
+    Z = np.random.randn(n, p)
+    return np.dot(Z, Sigma_sqrt.T) + np.asarray(mu).reshape(1, -1)
+
 def sample_ar1t(
     rhos,
     n=50,
@@ -393,7 +441,7 @@ def sample_ar1t(
     """
     # Initial t samples
     p = rhos.shape[0] + 1
-    tvars = stats.t(df=df_t).rvs(size=(n,p))
+    tvars = np.random.standard_t(df_t, size=(n,p))
 
     # Initialize X
     X = np.zeros((n, p))
@@ -459,7 +507,7 @@ def sample_block_tmvn(
     for i, block_sqrt in enumerate(block_sqrts):
         # Dimensionality and also sample chisquares
         p_block = block_sqrt.shape[0]
-        chi_block = stats.chi2.rvs(df=df_t, size=(n,1))
+        chi_block = np.random.chisquare(df_t, size=(n,1))
 
         # Linear transformatino + chi square multiplication
         Z_block = np.random.randn(n,p_block) # n x p 
@@ -651,6 +699,7 @@ def sample_data(
     # Defaults
     if mu is None:
         mu = np.zeros(p)
+    X = None
 
     # Ising / Gibbs Sampling
     if x_dist == 'gibbs':
@@ -679,9 +728,12 @@ def sample_data(
         elif method == 'partialcorr':
             corr_matrix, Q = PartialCorr(p=p, **kwargs)
         elif method == "daibarber2016":
-            _, _, beta, Q, corr_matrix, _ = daibarber2016_graph(
+            # Keep the design, which is sampled with the
+            # cached cholesky factor of corr_matrix
+            X, _, beta, Q, corr_matrix, _ = daibarber2016_graph(
                 p=p,
                 n=n,
+                mu=mu,
                 coeff_size=coeff_size,
                 coeff_dist=coeff_dist,
                 sparsity=sparsity,
@@ -695,8 +747,13 @@ def sample_data(
             Q = chol2inv(corr_matrix)
         elif method == 'qer':
             Q = ErdosRenyi(p=p, **kwargs)
-            corr_matrix = cov2corr(chol2inv(Q))
-            Q = chol2inv(corr_matrix)
+            # Rescaling Sigma to a correlation matrix rescales Q by
+            # the reciprocal scales, so only one inversion is needed
+            Sigma = chol2inv(Q)
+            scale = np.sqrt(np.diag(Sigma))
+            scale_matrix = np.outer(scale, scale)
+            corr_matrix = Sigma / scale_matrix
+            Q = Q * scale_matrix
         elif method == 'dirichlet':
             corr_matrix = DirichletCorr(p=p, **kwargs)
             Q = chol2inv(corr_matrix)
@@ -733,7 +790,8 @@ def sample_data(
     if x_dist == 'gibbs':
         pass
     elif x_dist == 'gaussian':
-        X = stats.multivariate_normal.rvs(mean=mu, cov=corr_matrix, size=n)
+        if X is None:
+            X = sample_mvn(mu=mu, Sigma=corr_matrix, n=n)
     elif x_dist == 'ar1t':
         if str(method).lower() != 'ar1':
             raise ValueError(f"For x_dist={x_dist}, method ({method}) should equal 'ar1'")
@@ -758,26 +816,34 @@ def create_correlation_tree(corr_matrix, method="average"):
     :param method: 'single', 'average', 'fro', or 'complete'
     returns: 'link' of the correlation tree, as in scipy"""
 
-    # Distance matrix for tree method
+    # Linkage method for each tree method
+    linkage_methods = {
+        "single": "single",
+        "average": "average",
+        "fro": "average",
+        "complete": "complete",
+    }
+    if method not in linkage_methods:
+        raise ValueError(
+            f'Only "single", "complete", "average", "fro" are valid methods, not {method}'
+        )
+
+    # Condensed distance matrix for tree method: only the
+    # upper triangle is needed (same ordering as squareform).
+    # The indexing already copies, so work in place from there.
+    p = corr_matrix.shape[0]
+    condensed_dist_matrix = corr_matrix[np.triu_indices(p, 1)].astype(
+        "float64", copy=False
+    )
     if method == "fro":
-        dist_matrix = np.around(1 - np.power(corr_matrix, 2), decimals=7)
+        np.square(condensed_dist_matrix, out=condensed_dist_matrix)
     else:
-        dist_matrix = np.around(1 - np.abs(corr_matrix), decimals=7)
-    dist_matrix -= np.diagflat(np.diag(dist_matrix))
-
-    condensed_dist_matrix = ssd.squareform(dist_matrix)
+        np.abs(condensed_dist_matrix, out=condensed_dist_matrix)
+    np.subtract(1, condensed_dist_matrix, out=condensed_dist_matrix)
+    np.around(condensed_dist_matrix, decimals=7, out=condensed_dist_matrix)
 
     # Create linkage
-    if method == "single":
-        link = hierarchy.single(condensed_dist_matrix)
-    elif method == "average" or method == "fro":
-        link = hierarchy.average(condensed_dist_matrix)
-    elif method == "complete":
-        link = hierarchy.complete(condensed_dist_matrix)
-    else:
-        raise ValueError(
-            f'Only "single", "complete", "average", "fro" are valid methods, not {method}'
-        )
+    link = hierarchy.linkage(condensed_dist_matrix, method=linkage_methods[method])
 
     return link
 
@@ -106,18 +106,21 @@ class KnockoffFilter:
 		# Possibly use recycling
 		if self.recycle_up_to is not None:
 
-			# Split
-			rec_knockoffs = self.X[:self.recycle_up_to]
-			new_knockoffs = knockoffs[self.recycle_up_to:]
-
-			# Combine
-			knockoffs = np.concatenate((rec_knockoffs, new_knockoffs), axis=0)
+			# The metro samplers keep a reference to the knockoffs
+			# they return, so only overwrite arrays we own
+			if self.knockoff_type != 'gaussian':
+				knockoffs = knockoffs.copy()
+			knockoffs[:self.recycle_up_to] = self.X[:self.recycle_up_to]
 
 		# For high precision simulations of degenerate knockoffs,
 		# ensure degeneracy
 		if self._sdp_degen:
 			sumcols = self.X[:, 0] + knockoffs[:, 0]
-			knockoffs = sumcols.reshape(-1, 1) - self.X
+			# Gaussian knockoffs are ours, so overwrite them
+			if self.knockoff_type == 'gaussian':
+				np.subtract(sumcols.reshape(-1, 1), self.X, out=knockoffs)
+			else:
+				knockoffs = sumcols.reshape(-1, 1) - self.X
 
 		self.knockoffs = knockoffs
 		self.S = S
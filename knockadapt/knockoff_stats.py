@@ -8,16 +8,22 @@ from group_lasso import GroupLasso, LogisticGroupLasso
 from pyglmnet import GLMCV
 
 from . import deeppink
-from .utilities import calc_group_sizes, random_permutation_inds
+from .utilities import random_permutation_inds
 
+# Shared across fits, so these are read-only
 DEFAULT_REG_VALS = np.logspace(-4, 4, base=10, num=20)
+DEFAULT_REG_VALS.flags.writeable = False
+DEFAULT_INV_REG_VALS = 1 / DEFAULT_REG_VALS
+DEFAULT_INV_REG_VALS.flags.writeable = False
 
 
-def calc_mse(model, X, y):
-	""" Gets MSE of a model """
-	preds = model.predict(X)
-	resids = (preds - y) / y.std()
-	return np.sum((resids) ** 2)
+def calc_mse(model, X, y, y_var=None):
+	""" Gets MSE of a model (scaled by the variance of y, which
+	can be passed as y_var to avoid recomputing it) """
+	if y_var is None:
+		y_var = np.var(y)
+	resids = model.predict(X).reshape(-1) - y.reshape(-1)
+	return float(np.dot(resids, resids)) / float(y_var)
 
 
 def use_reg_lasso(groups):
@@ -36,9 +42,10 @@ def use_reg_lasso(groups):
 
 def parse_y_dist(y):
 	n = y.shape[0]
-	if np.unique(y).shape[0] == 2:
+	num_unique = np.unique(y).shape[0]
+	if num_unique == 2:
 		return "binomial"
-	elif np.unique(y).shape[0] == n:
+	elif num_unique == n:
 		return "gaussian"
 	else:
 		raise ValueError(
@@ -54,6 +61,28 @@ def parse_logistic_flag(kwargs):
 	return False
 
 
+def bind_features(X, knockoffs, rev_inds=None):
+	""" Binds X and knockoffs into a single n x 2p (Fortran-ordered)
+	feature matrix, without any intermediate copies.
+	:param X: n x p design matrix
+	:param knockoffs: n x p knockoff matrix
+	:param rev_inds: If supplied, the inverse of a permutation inds
+	of the 2p columns (see random_permutation_inds). The returned
+	matrix then equals np.concatenate([X, knockoffs], axis=1)[:, inds].
+	"""
+	n, p = X.shape
+	dtype = np.result_type(X, knockoffs, np.float32)
+	features = np.empty((n, 2 * p), dtype=dtype, order="F")
+	if rev_inds is None:
+		features[:, 0:p] = X
+		features[:, p:] = knockoffs
+	else:
+		rev_inds = np.asarray(rev_inds)
+		features[:, rev_inds[0:p]] = X
+		features[:, rev_inds[p:]] = knockoffs
+	return features
+
+
 def combine_Z_stats(Z, groups=None, pair_agg="cd", group_agg="sum"):
 	"""
 	Given a "Z" statistic for each feature AND each knockoff, returns
@@ -85,29 +114,31 @@ def combine_Z_stats(Z, groups=None, pair_agg="cd", group_agg="sum"):
 	pair_agg = str(pair_agg).lower()
 	# Absolute coefficient differences
 	if pair_agg == "cd":
-		pair_W = np.abs(Z[0:p]) - np.abs(Z[p:])
+		abs_Z = np.abs(Z)
+		pair_W = abs_Z[0:p] - abs_Z[p:]
 	# Signed maxes
 	elif pair_agg == "sm":
-		inds = np.arange(0, p, 1)
-		pair_W = np.maximum(np.abs(Z[inds]), np.abs(Z[inds + p]))
-		pair_W = pair_W * np.sign(np.abs(Z[inds]) - np.abs(Z[inds + p]))
+		abs_Z = np.abs(Z)
+		pair_W = np.maximum(abs_Z[0:p], abs_Z[p:])
+		pair_W *= np.sign(abs_Z[0:p] - abs_Z[p:])
 	# Simple coefficient differences
 	elif pair_agg == "scd":
 		pair_W = Z[0:p] - Z[p:]
 	else:
 		raise ValueError(f'pair_agg ({pair_agg}) must be one of "cd", "sm", "scd"')
 
-	# Step 2: Group statistics
-	m = np.unique(groups).shape[0]
-	W_group = np.zeros(m)
-	for j in range(p):
-		W_group[groups[j] - 1] += pair_W[j]
+	# Step 2: Group statistics (a single weighted bincount
+	# over the group labels, which are mapped to 0, ..., m-1)
+	_, group_inds, group_sizes = np.unique(
+		groups, return_inverse=True, return_counts=True
+	)
+	group_inds = group_inds.reshape(-1)
+	W_group = np.bincount(group_inds, weights=pair_W)
 
 	# If averaging...
 	if group_agg == "sum":
 		pass
 	elif group_agg == "avg":
-		group_sizes = calc_group_sizes(groups)
 		W_group = W_group / group_sizes
 	else:
 		raise ValueError(f'group_agg ({group_agg}) must be one of "sum", "avg"')
@@ -132,13 +163,10 @@ def calc_lars_path(X, knockoffs, y, groups=None, **kwargs):
 	if "y_dist" in kwargs:
 		kwargs.pop("y_dist")
 
-	# Bind data
+	# Bind data, randomizing coordinates to make sure everything is symmetric
 	p = X.shape[1]
-	features = np.concatenate([X, knockoffs], axis=1)
-
-	# Randomize coordinates to make sure everything is symmetric
 	inds, rev_inds = random_permutation_inds(2 * p)
-	features = features[:, inds]
+	features = bind_features(X, knockoffs, rev_inds)
 
 	# By default, all variables are their own group
 	if groups is None:
@@ -176,82 +204,84 @@ def fit_lasso(X, knockoffs, y, y_dist=None, use_lars=False, **kwargs):
 	if y_dist is None:
 		y_dist = parse_y_dist(y)
 
-	# Bind data
+	# Bind data, randomizing coordinates to make sure everything is symmetric
 	p = X.shape[1]
-	features = np.concatenate([X, knockoffs], axis=1)
-
-	# Randomize coordinates to make sure everything is symmetric
 	inds, rev_inds = random_permutation_inds(2 * p)
-	features = features[:, inds]
+	features = bind_features(X, knockoffs, rev_inds)
 
 	# Fit lasso
-	warnings.filterwarnings("ignore")
-	if y_dist == "gaussian":
-		if not use_lars:
-			gl = linear_model.LassoCV(
-				alphas=DEFAULT_REG_VALS,
-				cv=cv,
-				verbose=False,
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore")
+		if y_dist == "gaussian":
+			if not use_lars:
+				gl = linear_model.LassoCV(
+					alphas=DEFAULT_REG_VALS,
+					cv=cv,
+					verbose=False,
+					max_iter=max_iter,
+					tol=tol,
+					**kwargs,
+				).fit(features, y)
+			elif use_lars:
+				gl = linear_model.LassoLarsCV(
+					cv=cv, verbose=False, max_iter=max_iter, **kwargs,
+				).fit(features, y)
+		elif y_dist == "binomial":
+			gl = linear_model.LogisticRegressionCV(
+				Cs=DEFAULT_INV_REG_VALS,
+				penalty="l1",
 				max_iter=max_iter,
 				tol=tol,
+				cv=cv,
+				verbose=False,
+				solver="liblinear",
 				**kwargs,
 			).fit(features, y)
-		elif use_lars:
-			gl = linear_model.LassoLarsCV(
-				cv=cv, verbose=False, max_iter=max_iter, **kwargs,
-			).fit(features, y)
-	elif y_dist == "binomial":
-		gl = linear_model.LogisticRegressionCV(
-			Cs=1 / DEFAULT_REG_VALS,
-			penalty="l1",
-			max_iter=max_iter,
-			tol=tol,
-			cv=cv,
-			verbose=False,
-			solver="liblinear",
-			**kwargs,
-		).fit(features, y)
-	else:
-		raise ValueError(f"y_dist must be one of gaussian, binomial, not {y_dist}")
-	warnings.resetwarnings()
+		else:
+			raise ValueError(f"y_dist must be one of gaussian, binomial, not {y_dist}")
 
 	return gl, inds, rev_inds
 
 def fit_ridge(X, knockoffs, y, y_dist=None, **kwargs):
 
-	# Bind data
+	# Bind data, randomizing coordinates to ensure antisymmetry
 	p = X.shape[1]
-	features = np.concatenate([X, knockoffs], axis=1)
-
-	# Randomize coordinates to ensure antisymmetry
 	inds, rev_inds = random_permutation_inds(2 * p)
-	features = features[:, inds]
+	features = bind_features(X, knockoffs, rev_inds)
 
 	# Fit lasso
-	warnings.filterwarnings("ignore")
-	if y_dist == "gaussian":
-		ridge = linear_model.RidgeCV(
-			alphas=DEFAULT_REG_VALS,
-			store_cv_values=True,
-			scoring='neg_mean_squared_error',
-			**kwargs,
-		).fit(features, y)
-	elif y_dist == "binomial":
-		ridge = linear_model.LogisticRegressionCV(
-			Cs=1 / DEFAULT_REG_VALS,
-			penalty="l2",
-			solver="liblinear",
-			**kwargs,
-		).fit(features, y)
-	else:
-		raise ValueError(f"y_dist must be one of gaussian, binomial, not {y_dist}")
-	warnings.resetwarnings()
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore")
+		if y_dist == "gaussian":
+			ridge = linear_model.RidgeCV(
+				alphas=DEFAULT_REG_VALS,
+				store_cv_values=True,
+				scoring='neg_mean_squared_error',
+				**kwargs,
+			).fit(features, y)
+		elif y_dist == "binomial":
+			ridge = linear_model.LogisticRegressionCV(
+				Cs=DEFAULT_INV_REG_VALS,
+				penalty="l2",
+				solver="liblinear",
+				**kwargs,
+			).fit(features, y)
+		else:
+			raise ValueError(f"y_dist must be one of gaussian, binomial, not {y_dist}")
 
 	return ridge, inds, rev_inds
 
 
 def fit_group_lasso(
-	X, knockoffs, y, groups, use_pyglm=True, y_dist=None, group_lasso=True, **kwargs,
+	X,
+	knockoffs,
+	y,
+	groups,
+	use_pyglm=True,
+	y_dist=None,
+	group_lasso=True,
+	check_groups=True,
+	**kwargs,
 ):
 	""" Fits a group lasso model.
 	:param X: n x p design matrix
@@ -261,6 +291,9 @@ def fit_group_lasso(
 	Else use the regular one
 	:param y_dist: Either "gaussian" or "binomial" (for logistic regression)
 	:param group_lasso: If False, do not use group regularization.
+	:param check_groups: If True, fall back to a regular lasso when
+	each variable is its own group. Callers which have already made
+	this check (via use_reg_lasso) can set this to False.
 	:param kwargs: kwargs for group-lasso GroupLasso class.
 	In particular includes reg_vals, a list of regularizations
 	(lambda values) which defaults to [(0.05, 0.05)]. In each
@@ -268,8 +301,6 @@ def fit_group_lasso(
 	the second value is the individual regularization.
 	"""
 
-	warnings.filterwarnings("ignore")
-
 	# Parse some kwargs/defaults
 	if "max_iter" in kwargs:
 		max_iter = kwargs.pop("max_iter")
@@ -293,16 +324,14 @@ def fit_group_lasso(
 	# Bind data
 	n = X.shape[0]
 	p = X.shape[1]
-	features = np.concatenate([X, knockoffs], axis=1)
 
 	# By default, all variables are their own group
 	if groups is None:
 		groups = np.arange(1, p + 1, 1)
-	m = np.unique(groups).shape[0]
 
-	# If m == p, meaning each variable is their own group,
-	# just fit a regular lasso
-	if m == p or not group_lasso:
+	# If each variable is its own group, just fit a regular
+	# lasso (checking the flags first avoids sorting groups)
+	if not group_lasso or (check_groups and use_reg_lasso(groups)):
 		return fit_lasso(X, knockoffs, y, y_dist, **kwargs)
 
 	# Make sure variables and their knockoffs are in the same group
@@ -311,13 +340,15 @@ def fit_group_lasso(
 
 	# Randomize coordinates to make sure everything is symmetric
 	inds, rev_inds = random_permutation_inds(2 * p)
-	features = features[:, inds]
+	features = bind_features(X, knockoffs, rev_inds)
 	doubled_groups = doubled_groups[inds]
 
 	# Standardize - important for pyglmnet performance,
 	# highly detrimental for group_lasso performance
+	# (features is freshly allocated, so this is done in place)
 	if use_pyglm:
-		features = (features - features.mean()) / features.std()
+		features -= features.mean()
+		features /= features.std()
 		if y_dist == "gaussian":
 			y = (y - y.mean()) / y.std()
 
@@ -327,66 +358,70 @@ def fit_group_lasso(
 	else:
 		reg_vals = [(x, x) for x in DEFAULT_REG_VALS]
 
-	# Fit pyglm model using warm starts
-	if use_pyglm:
-
-		l1_regs = [x[0] for x in reg_vals]
-
-		gl = GLMCV(
-			distr=y_dist,
-			tol=tol,
-			group=doubled_groups,
-			alpha=1.0,
-			learning_rate=learning_rate,
-			max_iter=max_iter,
-			reg_lambda=l1_regs,
-			cv=cv,
-			solver="cdfast",
-		)
-		gl.fit(features, y)
-
-		# Pull score, rename
-		best_score = -1 * calc_mse(gl, features, y)
-		best_gl = gl
-
-	# Fit model
-	if not use_pyglm:
-		best_gl = None
-		best_score = -1 * np.inf
-		for group_reg, l1_reg in reg_vals:
-
-			# Fit logistic/gaussian group lasso
-			if not use_pyglm:
-				if y_dist.lower() == "gaussian":
-					gl = GroupLasso(
-						groups=doubled_groups,
-						tol=tol,
-						group_reg=group_reg,
-						l1_reg=l1_reg,
-						**kwargs,
-					)
-				elif y_dist.lower() == "binomial":
-					gl = LogisticGroupLasso(
-						groups=doubled_groups,
-						tol=tol,
-						group_reg=group_reg,
-						l1_reg=l1_reg,
-						**kwargs,
-					)
-				else:
-					raise ValueError(
-						f"y_dist must be one of gaussian, binomial, not {y_dist}"
-					)
-
-				gl.fit(features, y.reshape(n, 1))
-				score = -1 * calc_mse(gl, features, y.reshape(n, 1))
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore")
+		# Fit pyglm model using warm starts
+		if use_pyglm:
 
-			# Score, possibly select
-			if score > best_score:
-				best_score = score
-				best_gl = gl
+			# GLMCV warm starts each fit from the previous one, so
+			# traverse the path from the sparsest solution (largest
+			# regularization) downwards
+			l1_regs = sorted([x[0] for x in reg_vals], reverse=True)
 
-	warnings.resetwarnings()
+			gl = GLMCV(
+				distr=y_dist,
+				tol=tol,
+				group=doubled_groups,
+				alpha=1.0,
+				learning_rate=learning_rate,
+				max_iter=max_iter,
+				reg_lambda=l1_regs,
+				cv=cv,
+				solver="cdfast",
+			)
+			gl.fit(features, y)
+
+			# Pull score, rename
+			best_score = -1 * calc_mse(gl, features, y)
+			best_gl = gl
+
+		# Fit model
+		if not use_pyglm:
+			best_gl = None
+			best_score = -1 * np.inf
+			y_var = np.var(y)
+			for group_reg, l1_reg in reg_vals:
+
+				# Fit logistic/gaussian group lasso
+				if not use_pyglm:
+					if y_dist.lower() == "gaussian":
+						gl = GroupLasso(
+							groups=doubled_groups,
+							tol=tol,
+							group_reg=group_reg,
+							l1_reg=l1_reg,
+							**kwargs,
+						)
+					elif y_dist.lower() == "binomial":
+						gl = LogisticGroupLasso(
+							groups=doubled_groups,
+							tol=tol,
+							group_reg=group_reg,
+							l1_reg=l1_reg,
+							**kwargs,
+						)
+					else:
+						raise ValueError(
+							f"y_dist must be one of gaussian, binomial, not {y_dist}"
+						)
+
+					gl.fit(features, y.reshape(n, 1))
+					score = -1 * calc_mse(gl, features, y, y_var=y_var)
+
+				# Score, possibly select
+				if score > best_score:
+					best_score = score
+					best_gl = gl
 
 	return best_gl, inds, rev_inds
 
@@ -728,6 +763,11 @@ class LassoStatistic(FeatureStatistic):
 		zstat = str(zstat).lower()
 		if zstat == "coef":
 
+			# Parse which lasso package we are using (and pass
+			# the result to fit_group_lasso, so groups are only
+			# parsed once)
+			reg_lasso_flag = (not group_lasso) or use_reg_lasso(groups)
+
 			# Fit (possibly group) lasso
 			gl, inds, rev_inds = fit_group_lasso(
 				X,
@@ -735,13 +775,12 @@ class LassoStatistic(FeatureStatistic):
 				y,
 				groups=groups,
 				use_pyglm=use_pyglm,
-				group_lasso=group_lasso,
+				group_lasso=not reg_lasso_flag,
+				check_groups=False,
 				**kwargs,
 			)
 
-			# Parse the expected output format based on which
-			# lasso package we are using
-			reg_lasso_flag = use_reg_lasso(groups) or (not group_lasso)
+			# Parse the expected output format
 			logistic_flag = parse_logistic_flag(kwargs)
 
 			# Retrieve Z statistics
@@ -765,7 +804,7 @@ class LassoStatistic(FeatureStatistic):
 						f"Debiased lasso is not implemented for binomial data"
 					)
 				else:
-					features = np.concatenate([X, knockoffs], axis=1)
+					features = bind_features(X, knockoffs)
 					debias_term = np.dot(Ginv, features.T)
 					debias_term = np.dot(debias_term, y - np.dot(features, Z))
 					Z = Z + debias_term / n
@@ -785,7 +824,7 @@ class LassoStatistic(FeatureStatistic):
 				self.score_type = "mse_cv"
 			# Else compute the score
 			else:
-				features = np.concatenate([X, knockoffs], axis=1)[:, inds]
+				features = bind_features(X, knockoffs, rev_inds)
 				self.cv_score_model(
 					features=features,
 					y=y,
@@ -830,7 +869,7 @@ class MargCorrStatistic(FeatureStatistic):
 		"""
 
 		# Calc correlations
-		features = np.concatenate([X, knockoffs], axis=1)
+		features = bind_features(X, knockoffs)
 		correlations = np.corrcoef(features, y.reshape(-1, 1), rowvar=False)[-1][0:-1]
 
 		# Combine
@@ -864,9 +903,8 @@ class OLSStatistic(FeatureStatistic):
 
 		# Run linear regression, permute indexes to prevent FDR violations
 		p = X.shape[1]
-		features = np.concatenate([X, knockoffs], axis=1)
 		inds, rev_inds = random_permutation_inds(2 * p)
-		features = features[:, inds]
+		features = bind_features(X, knockoffs, rev_inds)
 
 		lm = linear_model.LinearRegression(fit_intercept=False).fit(features, y)
 		Z = lm.coef_
@@ -927,13 +965,10 @@ class RandomForestStatistic(FeatureStatistic):
 		"""
 
 
-		# Bind data
+		# Bind data, randomizing coordinates to make sure everything is symmetric
 		p = X.shape[1]
-		features = np.concatenate([X, knockoffs], axis=1)
-
-		# Randomize coordinates to make sure everything is symmetric
 		self.inds, self.rev_inds = random_permutation_inds(2 * p)
-		features = features[:, self.inds]
+		features = bind_features(X, knockoffs, self.rev_inds)
 
 		# By default, all variables are their own group
 		if groups is None:
@@ -1084,9 +1119,19 @@ def data_dependent_threshhold(W, fdr=0.10, offset=1):
 	p = W.shape[0]
 	batch = W.shape[1]
 
+	# Without any positive W statistics, the ratios are all at
+	# least one, so nothing can be selected: skip the sorting
+	if p == 0 or (fdr < 1 and not np.any(W > 0)):
+		acceptable = np.full(batch, np.inf)
+		if batch == 1:
+			acceptable = acceptable[0]
+		return acceptable
+
 	# Sort W by absolute values
-	ind = np.argsort(-1 * np.abs(W), axis=0)
+	abs_W = np.abs(W)
+	ind = np.argsort(-1 * abs_W, axis=0)
 	sorted_W = np.take_along_axis(W, ind, axis=0)
+	sorted_abs_W = np.take_along_axis(abs_W, ind, axis=0)
 
 	# Calculate ratios
 	negatives = np.cumsum(sorted_W <= 0, axis=0)
@@ -1094,27 +1139,25 @@ def data_dependent_threshhold(W, fdr=0.10, offset=1):
 	positives[positives == 0] = 1  # Don't divide by 0
 	ratios = (negatives + offset) / positives
 
+	# Find the last index satisfying FDR control (if any)
+	flags = ratios <= fdr
+	any_flags = flags.any(axis=0)
+	last_inds = p - 1 - np.argmax(flags[::-1], axis=0)
+
 	# Add zero as an option to prevent index errors
 	# (zero means select everything strictly > 0)
-	sorted_W = np.concatenate([sorted_W, np.zeros((1, batch))], axis=0)
-
-	# Find maximum indexes satisfying FDR control
-	# Adding np.arange is just a batching trick
-	helper = (ratios <= fdr) + np.arange(0, p, 1).reshape(-1, 1) / p
-	sorted_W[1:][helper < 1] = np.inf  # Never select values where the ratio > fdr
-	T_inds = np.argmax(helper, axis=0) + 1
-	more_inds = np.indices(T_inds.shape)
+	sorted_abs_W = np.concatenate([sorted_abs_W, np.zeros((1, batch))], axis=0)
 
-	# Find Ts
-	acceptable = np.abs(sorted_W)[T_inds, more_inds][0]
+	# Find Ts, never selecting anything if the ratio is always > fdr
+	acceptable = sorted_abs_W[last_inds + 1, np.arange(0, batch, 1)]
+	acceptable[~any_flags] = np.inf
 
 	# Replace 0s with a very small value to ensure that
 	# downstream you don't select W statistics == 0.
 	# This value is the smallest abs value of nonzero W
 	if np.sum(acceptable == 0) != 0:
-		W_new = W.copy()
-		W_new[W_new == 0] = np.abs(W).max()
-		zero_replacement = np.abs(W_new).min(axis=0)
+		abs_W_new = np.where(abs_W == 0, abs_W.max(), abs_W)
+		zero_replacement = abs_W_new.min(axis=0)
 		acceptable[acceptable == 0] = zero_replacement[acceptable == 0]
 
 	if batch == 1:
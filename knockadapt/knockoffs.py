@@ -1,11 +1,10 @@
 import warnings
 import numpy as np
 import scipy as sp
-from scipy import stats
 import scipy.linalg
 
 from .utilities import calc_group_sizes, preprocess_groups
-from .utilities import shift_until_PSD, scale_until_PSD
+from .utilities import scale_until_PSD
 from . import utilities
 from . import mrc
 
@@ -188,9 +187,9 @@ def solve_SDP(
     }
 
     # Solve
-    warnings.filterwarnings("ignore")
-    result = dsdp(A, b, C, K, OPTIONS=OPTIONS)
-    warnings.resetwarnings()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = dsdp(A, b, C, K, OPTIONS=OPTIONS)
 
     # Raise an error if unsolvable
     status = result['STATS']['stype']
@@ -628,6 +627,7 @@ def gaussian_knockoffs(
     Sigma=None,
     groups=None,
     invSigma=None,
+    check_invSigma=True,
     copies=1,
     sample_tol=1e-5,
     S=None,
@@ -644,6 +644,11 @@ def gaussian_knockoffs(
     :param mu: true mean of X, of dimension p.
     :param Sigma: true covariance matrix of X, of dimension p x p
     :param groups: numpy array of length p, list of groups of X
+    :param invSigma: the precision matrix of X, of dimension p x p.
+    Defaults to None and will be computed from Sigma.
+    :param check_invSigma: If True, check that invSigma is the inverse
+    of Sigma. Set this to False to skip the check (a p x p matrix
+    product) for a trusted invSigma. Defaults to True.
     :param copies: integer number of knockoff copies of each observation to draw
     :param S: the S matrix defined s.t. Cov(X, tilde(X)) = Sigma - S. Defaults to None
     and will be constructed by knockoff generator.
@@ -743,7 +748,7 @@ def gaussian_knockoffs(
     # Get precision matrix
     if invSigma is None:
         invSigma = utilities.chol2inv(Sigma)
-    else:
+    elif check_invSigma:
         product = np.dot(Sigma, invSigma)
         max_error = np.abs(product - np.eye(p)).max()
         if max_error > sample_tol:
@@ -805,8 +810,8 @@ def produce_FX_gaussian_knockoffs(X, invSigma, S, scale, copies=1):
 
     # Calculate C matrix
     n, p = X.shape
-    #invSigma_S = np.dot(invSigma, S)
-    CTC = 2*S - np.dot(S, np.dot(invSigma, S))
+    invSigma_S = np.dot(invSigma, S)
+    CTC = 2*S - np.dot(S, invSigma_S)
     C = scipy.linalg.cholesky(CTC)
 
     # Calculate U matrix
@@ -816,7 +821,7 @@ def produce_FX_gaussian_knockoffs(X, invSigma, S, scale, copies=1):
     U = Q[:,p:2*p]
 
     # Randomize if copies > 1
-    knockoff_base = np.dot(X, np.eye(p) - np.dot(invSigma, S))
+    knockoff_base = X - np.dot(X, invSigma_S)
     if copies > 1:
         knockoffs = []
         for j in range(copies):
@@ -832,7 +837,8 @@ def produce_FX_gaussian_knockoffs(X, invSigma, S, scale, copies=1):
         # Calculate knockoffs and return
         knockoffs = [(knockoff_base + np.dot(U, C)) * scale]
 
-    knockoffs = np.stack(knockoffs, axis=-1)
+    # Keep each copy contiguous in memory
+    knockoffs = np.stack(knockoffs, axis=0).transpose(1, 2, 0)
     return knockoffs
 
 
@@ -845,35 +851,24 @@ def produce_MX_gaussian_knockoffs(X, mu, invSigma, S, sample_tol, copies, verbos
     Vk = 2 * S - np.dot(S, invSigma_S)
 
     # Account for numerical errors
-    min_eig = np.linalg.eigh(Vk)[0].min()
+    eigvals, eigvecs = np.linalg.eigh(Vk)
+    min_eig = eigvals.min()
     if min_eig < sample_tol and verbose:
         warnings.warn(
             f"Minimum eigenvalue of Vk is {min_eig}, under tolerance {sample_tol}"
         )
-        Vk = shift_until_PSD(Vk, sample_tol)
-
-    # ...and sample MX knockoffs!
-    knockoffs = stats.multivariate_normal.rvs(mean=np.zeros(p), cov=Vk, size=copies * n)
-
-    # Account for case when n * copies == 1
-    if n * copies == 1:
-        knockoffs = knockoffs.reshape(-1, 1)
-
-    # (Save this for testing later)
-    first_row = knockoffs[0, 0:n].copy()
-
-    # Some annoying reshaping...
-    knockoffs = knockoffs.flatten(order="C")
-    knockoffs = knockoffs.reshape(p, n, copies, order="F")
-    knockoffs = np.transpose(knockoffs, [1, 0, 2])
+        # Equivalent to shift_until_PSD on Vk
+        eigvals = eigvals + sample_tol - min_eig
+    elif min_eig < -sample_tol:
+        warnings.warn(
+            f"Minimum eigenvalue of Vk is {min_eig}, clipping negative eigenvalues to 0"
+        )
 
-    # (Test we have reshaped correctly)
-    new_first_row = knockoffs[0, 0:n, 0]
-    np.testing.assert_array_almost_equal(
-        first_row,
-        new_first_row,
-        err_msg="Critical error - reshaping failed in knockoff generator",
-    )
+    # ...and sample MX knockoffs! Reuse the eigendecomposition as
+    # a square root of Vk and color all copies in a single matmul
+    sqrt_Vk = eigvecs * np.sqrt(np.maximum(eigvals, 0))
+    knockoffs = np.dot(np.random.randn(copies, n, p), sqrt_Vk.T)
+    knockoffs = np.transpose(knockoffs, [1, 2, 0])
 
     # Add mu
     mu_k = np.expand_dims(mu_k, axis=2)
@@ -1,6 +1,7 @@
 import warnings
 import numpy as np
 import scipy as sp
+import scipy.linalg
 import sklearn.covariance
 
 ### Group helpers
@@ -9,9 +10,8 @@ import sklearn.covariance
 def preprocess_groups(groups):
     """ Turns a p-dimensional numpy array with m unique elements
     into a list of integers from 1 to m"""
-    unique_vals = np.unique(groups)
-    conversion = {unique_vals[i]: i for i in range(unique_vals.shape[0])}
-    return np.array([conversion[x] + 1 for x in groups])
+    _, inverse = np.unique(groups, return_inverse=True)
+    return inverse.reshape(-1) + 1
 
 
 def fetch_group_nonnulls(non_nulls, groups):
@@ -29,14 +29,14 @@ def fetch_group_nonnulls(non_nulls, groups):
     if not isinstance(groups, np.ndarray):
         groups = np.array(groups)
 
-    # Initialize
+    # Sum absolute coefficients within each group (labels 1 to m)
     m = np.unique(groups).shape[0]
-    group_nonnulls = np.zeros(m)
+    group_sums = np.bincount(
+        groups.astype("int64"), weights=np.abs(non_nulls), minlength=m + 1
+    )
 
     # Calculate and return
-    for j in range(m):
-        flag = np.abs(non_nulls[groups == j + 1]).sum() > 0
-        group_nonnulls[j] = float(flag)
+    group_nonnulls = (group_sums[1:m + 1] > 0).astype("float64")
     return group_nonnulls
 
 
@@ -48,22 +48,20 @@ def calc_group_sizes(groups):
     """
     if not isinstance(groups, np.ndarray):
         groups = np.array(groups)
-    if np.all(groups.astype("int32") != groups):
+    int_groups = groups.astype("int32")
+    if np.all(int_groups != groups):
         raise TypeError(
             "groups cannot contain non-integer values: apply preprocess_groups first"
         )
     else:
-        groups = groups.astype("int32")
+        groups = int_groups
 
-    if np.min(groups) == 0:
+    if groups.min() == 0:
         raise ValueError(
             "groups cannot contain 0: add one or apply preprocess_groups first"
         )
 
-    m = groups.max()
-    group_sizes = np.zeros(m)
-    for j in groups:
-        group_sizes[j - 1] += 1
+    group_sizes = np.bincount(groups)[1:]
     group_sizes = group_sizes.astype("int32")
     return group_sizes
 
@@ -74,18 +72,41 @@ def cov2corr(M):
     scale = np.sqrt(np.diag(M))
     return M / np.outer(scale, scale)
 
-def chol2inv(X):
-    """ Uses cholesky decomp to get inverse of matrix """
-    triang = np.linalg.inv(np.linalg.cholesky(X))
-    return np.dot(triang.T, triang)
+def chol2inv(X, L=None):
+    """ Uses cholesky decomp to get inverse of matrix
+    :param X: p x p positive definite matrix
+    :param L: the lower cholesky factor of X, if it has
+    already been computed. Defaults to None.
+    """
+    # LAPACK inverts directly from the cholesky factor,
+    # filling in the lower triangle of the inverse
+    if L is None:
+        L = np.linalg.cholesky(X)
+    invX, info = sp.linalg.lapack.dpotri(L, lower=True)
+    if info != 0:
+        raise np.linalg.LinAlgError(f"Cholesky inversion failed (info={info})")
+    # The upper triangle is still zero (as in L), so fill it in place
+    invX += np.tril(invX, -1).T
+    return invX
 
 
 def shift_until_PSD(M, tol):
     """ Add the identity until a p x p matrix M has eigenvalues of at least tol"""
     p = M.shape[0]
-    mineig = np.linalg.eigh(M)[0].min()
+    # A cholesky decomposition of M - tol*I exists exactly when
+    # M needs no shift, and is much cheaper than any eigensolver
+    shifted_M = M.copy()
+    shifted_M[np.diag_indices(p)] -= tol
+    try:
+        np.linalg.cholesky(shifted_M)
+        return M
+    except np.linalg.LinAlgError:
+        pass
+
+    # Only the smallest eigenvalue is needed
+    mineig = sp.linalg.eigvalsh(M, subset_by_index=[0, 0])[0]
     if mineig < tol:
-        M += (tol - mineig) * np.eye(p)
+        M[np.diag_indices(p)] += tol - mineig
 
     return M
 
@@ -166,7 +187,7 @@ def random_permutation_inds(length):
 
 ### Helper for MX knockoffs when we infer Sigma, and also when
 ### X comes from the gibbs model
-def estimate_covariance(X, tol=1e-4, shrinkage = 'ledoitwolf'):
+def estimate_covariance(X, tol=1e-4, shrinkage = 'ledoitwolf', emp_cov=None):
     """ Estimates covariance matrix of X. 
     :param X: n x p data matrix
     :param tol: threshhold for minimum eigenvalue
@@ -176,41 +197,55 @@ def estimate_covariance(X, tol=1e-4, shrinkage = 'ledoitwolf'):
     if the minim eigenvalue of the empirical cov matrix
     is below a certain tolerance, this will apply shrinkage
     anyway.
+    :param emp_cov: The (unbiased) empirical covariance matrix
+    of X, if it has already been computed. Defaults to None.
     :returns: Sigma, invSigma
     """
-    Sigma = np.cov(X.T)
-    mineig = np.linalg.eigh(Sigma)[0].min()
+    n = X.shape[0]
+    if emp_cov is None:
+        Sigma = np.cov(X.T)
+    else:
+        Sigma = emp_cov
 
     # Parse none strng
     if str(shrinkage).lower() == 'none':
         shrinkage = None
 
-    # Possibly shrink Sigma
-    if mineig < tol or shrinkage is not None:
-        # Which shrinkage to use
-        if str(shrinkage).lower() == 'ledoitwolf' or shrinkage is None: 
-            ShrinkEst = sklearn.covariance.LedoitWolf()
-        elif str(shrinkage).lower() == 'graphicallasso':
-            ShrinkEst = sklearn.covariance.GraphicalLasso(alpha=0.1)
-        else:
-            raise ValueError(f"Shrinkage arg must be one of None, 'ledoitwolf', 'graphicallasso', not {shrinkage}")
-
-        # Fit shrinkage. Sometimes the Graphical Lasso raises errors
-        # so we handle these here.
+    # The minimum eigenvalue only matters if we might not shrink
+    if shrinkage is None:
+        mineig = sp.linalg.eigvalsh(Sigma, subset_by_index=[0, 0])[0]
+        if mineig >= tol:
+            return Sigma, chol2inv(Sigma)
+        shrinkage = 'ledoitwolf'
+
+    # Which shrinkage to use
+    shrinkage = str(shrinkage).lower()
+    if shrinkage not in ['ledoitwolf', 'graphicallasso']:
+        raise ValueError(f"Shrinkage arg must be one of None, 'ledoitwolf', 'graphicallasso', not {shrinkage}")
+
+    # Fit the graphical lasso on the empirical covariance we
+    # already have (sklearn uses the biased estimator). Sometimes
+    # the Graphical Lasso raises errors so we handle these here.
+    if shrinkage == 'graphicallasso':
         try:
-            warnings.filterwarnings("ignore")
-            ShrinkEst.fit(X)
-            warnings.resetwarnings()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                Sigma, invSigma = sklearn.covariance.graphical_lasso(
+                    Sigma * (n - 1) / n, alpha=0.1
+                )
+            return Sigma, invSigma
         except FloatingPointError:
-            warnings.resetwarnings()
             warnings.warn(f"Graphical lasso failed, LedoitWolf matrix")
-            ShrinkEst = sklearn.covariance.LedoitWolf()
-            ShrinkEst.fit(X)
-
-        # Return
-        Sigma = ShrinkEst.covariance_
-        invSigma = ShrinkEst.precision_
-        return Sigma, invSigma
 
-    # Else return empirical estimate
-    return Sigma, chol2inv(Sigma)
\ No newline at end of file
+    # Fit LedoitWolf: this shrinks the (biased) empirical covariance
+    # we already have, which is all sklearn's LedoitWolf estimator does
+    # after computing the shrinkage intensity
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        lw_shrinkage = sklearn.covariance.ledoit_wolf_shrinkage(X)
+    Sigma = sklearn.covariance.shrunk_covariance(Sigma * (n - 1) / n, lw_shrinkage)
+    try:
+        invSigma = chol2inv(Sigma)
+    except np.linalg.LinAlgError:
+        invSigma = sp.linalg.pinvh(Sigma)
+    return Sigma, invSigma
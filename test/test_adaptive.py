@@ -111,6 +111,25 @@ class TestGroupKnockoffEval(unittest.TestCase):
 		)
 
 
+	def test_cached_precision(self):
+		""" Tests the cached precision matrix """
+
+		gkval = GroupKnockoffEval(self.corr_matrix, q=self.q, non_nulls=self.beta)
+		self.assertTrue(
+			gkval.invSigma is None,
+			msg = 'GroupKnockoffEval computes the precision matrix before it is needed'
+		)
+		gkval.sample_knockoffs(self.X, self.groups, copies=1, fixedX=True)
+		self.assertTrue(
+			gkval.invSigma is None,
+			msg = 'GroupKnockoffEval computes the precision matrix for fixedX knockoffs'
+		)
+		gkval.sample_knockoffs(self.X, self.groups, copies=1)
+		np.testing.assert_array_almost_equal(
+			np.dot(gkval.invSigma, self.corr_matrix), np.eye(self.p),
+			err_msg = 'GroupKnockoffEval caches an incorrect precision matrix'
+		)
+
 	def test_sample_recycling(self):
 		""" Tests recycled knockoff samples   """
 
@@ -137,6 +156,23 @@ class TestGroupKnockoffEval(unittest.TestCase):
 			msg = 'Non-recycled knockoffs are somehow equal to design matrix'
 		)
 
+	def test_knockoff_copy_layout(self):
+		""" Tests each knockoff copy is contiguous in memory """
+
+		for recycle_up_to in [None, 100]:
+			knockoffs = self.gkval.sample_knockoffs(
+				self.X, self.groups, recycle_up_to = recycle_up_to, copies = 3
+			)
+			self.assertEqual(
+				knockoffs.shape, (self.X.shape[0], self.X.shape[1], 3),
+				msg = f'sample_knockoffs returns shape {knockoffs.shape} with recycle_up_to={recycle_up_to}'
+			)
+			for j in range(3):
+				self.assertTrue(
+					knockoffs[:, :, j].flags['C_CONTIGUOUS'],
+					msg = f'Knockoff copy {j} is not contiguous with recycle_up_to={recycle_up_to}'
+				)
+
 	def test_eval_knockoff_instance(self):
 
 		# These are fake knockoffs but whatever
@@ -190,6 +226,44 @@ class TestGroupKnockoffEval(unittest.TestCase):
 
 
 
+	def test_eval_grouping_no_copies(self):
+
+		fdp, power, epower, W = self.gkval.eval_grouping(
+			self.X, self.y, self.groups, copies = 0
+		)
+		m = np.unique(self.groups).shape[0]
+		self.assertEqual(
+			W.shape, (0, m),
+			msg = f'eval_grouping with no copies returns W of shape {W.shape}, expected {(0, m)}'
+		)
+		for out in [fdp, power, epower]:
+			self.assertEqual(
+				out.shape, (0,),
+				msg = f'eval_grouping with no copies returns output of shape {out.shape}, expected (0,)'
+			)
+
+	def test_eval_grouping_multiprocessing(self):
+
+		# The copies are seeded individually, so the results
+		# should not depend on the number of processes
+		outputs = []
+		for numprocesses in [1, 2]:
+			np.random.seed(110)
+			outputs.append(self.gkval.eval_grouping(
+				self.X, self.y, self.groups, copies = 2, numprocesses = numprocesses
+			))
+		fdp, power, epower, W = outputs[1]
+		m = np.unique(self.groups).shape[0]
+		self.assertEqual(
+			W.shape, (2, m),
+			msg = f'eval_grouping with multiprocessing returns W of shape {W.shape}, expected {(2, m)}'
+		)
+		for out1, out2 in zip(*outputs):
+			np.testing.assert_array_almost_equal(
+				out1, out2, decimal = 6,
+				err_msg = 'eval_grouping gives different answers with and without multiprocessing'
+			)
+
 	def test_eval_many_cutoffs(self):
 
 		# Try in easy case
@@ -209,6 +283,39 @@ class TestGroupKnockoffEval(unittest.TestCase):
 				msg = 'Empirical power is somehow smaller than actual power'
 			)
 
+	def test_shared_knockoffs(self):
+
+		# Count how often knockoffs are sampled
+		num_samples = []
+		sample_knockoffs = self.gkval.sample_knockoffs
+		def counting_sampler(*args, **kwargs):
+			num_samples.append(1)
+			return sample_knockoffs(*args, **kwargs)
+		self.gkval.sample_knockoffs = counting_sampler
+
+		try:
+			cutoffs, fdps, powers, epowers, Ws = self.gkval.eval_many_cutoffs(
+				X = self.X, y = self.y, link = self.link, reduction = 5,
+				copies = 2, share_knockoffs = True
+			)
+		finally:
+			del self.gkval.sample_knockoffs
+
+		self.assertEqual(
+			len(num_samples), 1,
+			msg = f'eval_many_cutoffs with share_knockoffs samples knockoffs {len(num_samples)} times, expected once'
+		)
+		for cutoff, W in zip(cutoffs, Ws):
+			self.assertEqual(
+				W.shape[0], 2,
+				msg = f'eval_many_cutoffs with share_knockoffs returns {W.shape[0]} W copies at cutoff {cutoff}, expected 2'
+			)
+		for power, epower in zip(powers, epowers):
+			self.assertTrue(
+				epower >= power,
+				msg = 'Empirical power is somehow smaller than actual power with shared knockoffs'
+			)
+
 	def test_power_eval(self):
 		""" Test power under two settings """
 
@@ -290,6 +290,47 @@ class TestSampleData(unittest.TestCase):
 			msg = f'Default daibarber2016 beta has {num_nonzero_features} nonzero features, expected 100'
 		)
 
+	def test_daibarber2016_cache(self):
+
+		# Cached matrices are shared across calls, and read-only
+		out1 = graphs.daibarber2016_matrices(p=20, group_size=5, rho=0.5, gamma=0.3)
+		out2 = graphs.daibarber2016_matrices(p=20, group_size=5, rho=0.5, gamma=0.3)
+		for M1, M2 in zip(out1, out2):
+			self.assertTrue(
+				M1 is M2, msg = 'daibarber2016_matrices does not cache its outputs'
+			)
+			self.assertFalse(
+				M1.flags.writeable, msg = 'daibarber2016_matrices returns writeable arrays'
+			)
+
+		# But the graph returns copies the caller can modify
+		_, _, _, Q, V, _ = graphs.daibarber2016_graph(
+			n=10, p=20, group_size=5, rho=0.5, gamma=0.3
+		)
+		V[0, 0] = 2
+		np.testing.assert_array_almost_equal(
+			out1[1][0, 0], 1, err_msg = 'Modifying daibarber2016 cov matrix changes the cache'
+		)
+
+	def test_daibarber2016_sample_mean(self):
+
+		# sample_data keeps the daibarber2016 design, with mean mu
+		np.random.seed(110)
+		n = 2000
+		p = 20
+		mu = 3 * np.ones(p)
+		X, _, _, _, V = graphs.sample_data(
+			n=n, p=p, mu=mu, method='daibarber2016', group_size=5, rho=0.5
+		)
+		np.testing.assert_array_almost_equal(
+			X.mean(axis=0), mu, decimal=1,
+			err_msg = 'sample_data ignores mu for the daibarber2016 method'
+		)
+		np.testing.assert_array_almost_equal(
+			np.corrcoef(X.T), V, decimal=1,
+			err_msg = 'sample_data samples from the wrong daibarber2016 cov matrix'
+		)
+
 	def test_dsliu2020_sample(self):
 
 		rho = 0.8
@@ -538,6 +579,32 @@ class TestSampleData(unittest.TestCase):
 			non_ar1_t
 		)
 
+	def test_mvn_sample(self):
+
+		# Check that we get the right mean / covariance matrix
+		np.random.seed(110)
+		n = 100000
+		p = 5
+		V = graphs.AR1(p=p, rho=0.6)
+		mu = np.arange(0, p, 1)
+		X = graphs.sample_mvn(mu=mu, Sigma=V, n=n)
+		np.testing.assert_array_almost_equal(
+			mu, X.mean(axis=0), decimal=1,
+			err_msg=f"Gaussian sampler has unexpected mean"
+		)
+		np.testing.assert_array_almost_equal(
+			V, np.cov(X.T), decimal=2,
+			err_msg=f"Gaussian empirical covariance matrix does not match theoretical one"
+		)
+
+		# Check this also works for singular covariance matrices
+		V = np.ones((p, p))
+		X = graphs.sample_mvn(mu=np.zeros(p), Sigma=V, n=n)
+		np.testing.assert_array_almost_equal(
+			V, np.cov(X.T), decimal=2,
+			err_msg=f"Gaussian sampler fails for singular covariance matrices"
+		)
+
 	def test_gibbs_sample(self):
 
 		# Check that we get a decent correlation matrix
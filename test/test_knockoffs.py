@@ -719,6 +719,20 @@ class TestKnockoffGen(CheckValidKnockoffs):
             fx_knockoffs_low_n, 
         )
 
+        # Test a warning when Vk is not PSD
+        p = 5
+        X = np.random.randn(n, p)
+        with self.assertWarnsRegex(UserWarning, "Minimum eigenvalue of Vk"):
+            knockoffs.produce_MX_gaussian_knockoffs(
+                X=X,
+                mu=np.zeros(p),
+                invSigma=np.eye(p),
+                S=3*np.eye(p),
+                sample_tol=1e-5,
+                copies=1,
+                verbose=False
+            )
+
     def test_consistency_of_inferring_sigma(self):
         """ Checks that the same knockoffs are produced
         whether you infer the covariance matrix first and
@@ -86,9 +86,10 @@ class TestUtils(unittest.TestCase):
 	def test_force_pos_def(self):
 
 		# Random symmetric matrix, will have highly neg eigs
-		np.random.seed(110)
-		X = np.random.randn(100, 100)
-		X = (X.T + X)/2
+		rng = np.random.default_rng(110)
+		X = rng.standard_normal((100, 100))
+		np.add(X, X.T, out=X)
+		X *= 0.5
 
 		# Force pos definite
 		tol = 1e-3
@@ -104,16 +105,26 @@ class TestUtils(unittest.TestCase):
 	def test_chol2inv(self):
 
 		# Random pos def matrix
-		X = np.random.randn(100, 100)
+		rng = np.random.default_rng(110)
+		X = rng.standard_normal((100, 100))
 		X = np.dot(X.T, X)
 
-		# Check cholesky decomposition
+		# Check cholesky decomposition against a few random
+		# probe vectors (cheaper than forming X times its inverse)
 		inverse = utilities.chol2inv(X)
+		probes = rng.standard_normal((100, 4))
 		np.testing.assert_array_almost_equal(
-			np.eye(100), np.dot(X, inverse), decimal = 6,
+			probes, np.dot(X, np.dot(inverse, probes)), decimal = 6,
 			err_msg = 'chol2inv fails to correctly calculate inverses'
 		)
 
+		# Passing in the cholesky factor gives the same inverse
+		L = np.linalg.cholesky(X)
+		np.testing.assert_array_almost_equal(
+			inverse, utilities.chol2inv(X, L=L), decimal = 10,
+			err_msg = 'chol2inv gives a different inverse when passed the cholesky factor'
+		)
+
 	def test_misaligned_covariance_estimation(self):
 
 		# Inputs
@@ -156,6 +167,19 @@ class TestUtils(unittest.TestCase):
 			f"High-dimension covariance estimation is horrible"
 		)
 
+		# Passing in the empirical covariance gives the same answer
+		Vest2, Qest2 = utilities.estimate_covariance(
+			X, tol=1e-2, emp_cov=np.cov(X.T)
+		)
+		np.testing.assert_array_almost_equal(
+			Vest, Vest2, decimal=8,
+			err_msg = f"estimate_covariance gives different answers when passed emp_cov"
+		)
+		np.testing.assert_array_almost_equal(
+			np.dot(Vest2, Qest2), np.eye(p), decimal=6,
+			err_msg = f"estimate_covariance returns inconsistent precision matrix"
+		)
+
 
 
 